@@ -1,9 +1,13 @@
-import subprocess
+import functools
+import os
+import shutil
 import sys
+import time
+from collections.abc import Callable
 from pathlib import Path
+from types import MappingProxyType
 
-import ffmpeg
-from PySide6.QtCore import QObject, QThread, Signal
+from PySide6.QtCore import QObject, QProcess, QRunnable, QThreadPool, Signal
 from PySide6.QtWidgets import (
     QApplication,
     QFileDialog,
@@ -19,11 +23,17 @@ from PySide6.QtWidgets import (
     QVBoxLayout,
     QWidget,
 )
-from yt_dlp import YoutubeDL
 
+# Рабочая папка на момент импорта. После os.chdir() значение устареет.
+_CWD = Path.cwd()
 
+
+@functools.lru_cache(maxsize=1)
 def find_ffmpeg_location() -> Path | None:
-    """Возвращает папку с ffmpeg/ffprobe для yt-dlp (PATH, рядом с exe, _MEIPASS)."""
+    """Возвращает папку с ffmpeg/ffprobe для yt-dlp (PATH, рядом с exe, _MEIPASS).
+
+    Результат кэшируется на всё время работы приложения.
+    """
     candidates: list[Path] = []
 
     if getattr(sys, "frozen", False):
@@ -35,106 +45,290 @@ def find_ffmpeg_location() -> Path | None:
             meipass_dir = Path(meipass)
             candidates.extend([meipass_dir, meipass_dir / "bin"])
 
-    candidates.append(Path.cwd())
-    candidates.append(Path.cwd() / "bin")
+    candidates.append(_CWD)
+    candidates.append(_CWD / "bin")
 
+    # Одно чтение каталога вместо отдельного stat на каждый файл.
     for base in candidates:
-        ffmpeg_bin = base / "ffmpeg.exe"
-        ffprobe_bin = base / "ffprobe.exe"
-        if ffmpeg_bin.exists() and ffprobe_bin.exists():
+        try:
+            with os.scandir(base) as entries:
+                names = {entry.name.lower() for entry in entries}
+        except OSError:
+            continue
+        if {"ffmpeg.exe", "ffprobe.exe"}.issubset(names):
             return base
 
     # fallback на системный PATH
-    try:
-        subprocess.run(
-            ["ffmpeg", "-version"],
-            check=True,
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-        )
-        return None
-    except Exception:
-        return None
+    ffmpeg_path = shutil.which("ffmpeg")
+    if ffmpeg_path:
+        return Path(ffmpeg_path).parent
+    return None
+
+
+def _ffmpeg_executable(ffmpeg_location: Path | None) -> str | None:
+    """Возвращает путь к исполняемому ffmpeg в папке ffmpeg_location или в PATH."""
+    if ffmpeg_location:
+        return shutil.which("ffmpeg", path=str(ffmpeg_location))
+    return shutil.which("ffmpeg")
+
+
+# Пробное кодирование одного кадра: наличие h264_nvenc в «-encoders» ещё не значит,
+# что есть GPU NVIDIA и драйвер — многие сборки ffmpeg включают его всегда.
+_NVENC_TEST_ARGS = (
+    "-hide_banner",
+    "-f", "lavfi", "-i", "nullsrc=s=256x256",
+    "-frames:v", "1", "-c:v", "h264_nvenc",
+    "-f", "null", "-",
+)
+
+
+# Наборы опций yt-dlp собираются один раз при импорте и неизменяемы целиком: словари —
+# MappingProxyType, списки — кортежи. yt-dlp только читает их, кроме postprocessor_args,
+# где он требует настоящий dict, — его run() собирает заново при каждом запуске.
+_BASE_OPTS = MappingProxyType(
+    {
+        "noprogress": True,
+        "quiet": True,
+        # Параллельная загрузка фрагментов HLS/DASH и чанки для прогрессивных потоков.
+        "concurrent_fragment_downloads": 8,
+        "http_chunk_size": 10 * 1024 * 1024,
+        "retries": 3,
+        "fragment_retries": 3,
+    }
+)
+
+_AUDIO_MP3_OPTS = MappingProxyType(
+    {
+        "format": "bestaudio/best",
+        "postprocessors": (
+            MappingProxyType(
+                {
+                    "key": "FFmpegExtractAudio",
+                    "preferredcodec": "mp3",
+                    "preferredquality": "192",
+                }
+            ),
+        ),
+    }
+)
+
+# YouTube отдаёт AAC в m4a — ffmpeg просто копирует поток без перекодирования.
+_AUDIO_M4A_OPTS = MappingProxyType(
+    {
+        "format": "bestaudio[ext=m4a]/bestaudio",
+        "postprocessors": (
+            MappingProxyType(
+                {
+                    "key": "FFmpegExtractAudio",
+                    "preferredcodec": "m4a",
+                    "preferredquality": "0",
+                }
+            ),
+        ),
+    }
+)
+
+_VIDEO_FORMAT = (
+    "bestvideo[vcodec^=avc1][ext=mp4]+bestaudio[acodec^=mp4a][ext=m4a]/"
+    "best[vcodec^=avc1][ext=mp4]/best[ext=mp4]/best"
+)
+# Сортировка форматов, чтобы внутри каждого звена цепочки сразу выигрывал H.264/AAC.
+_FORMAT_SORT = ("vcodec:avc1", "ext:mp4", "acodec:mp4a", "res", "fps")
+
+_VIDEO_OPTS = MappingProxyType(
+    {
+        "format": _VIDEO_FORMAT,
+        "format_sort": _FORMAT_SORT,
+        "merge_output_format": "mp4",
+        "prefer_free_formats": False,
+        # Склейка H.264 + AAC — копирование потоков без перекодирования. Свой +faststart
+        # не добавляем: yt-dlp сам дописывает его к каждому выходу ffmpeg (это лишний
+        # проход по файлу, отключить его опциями нельзя). NVENC (_NVENC_OPTS) — отдельный
+        # путь для не-mp4 источников.
+        "postprocessor_args": MappingProxyType({"merger": ("-c", "copy")}),
+    }
+)
 
+# Лучшие потоки в исходных кодеках (VP9/AV1 + Opus) — меньше байт при том же качестве.
+# mkv принимает любые кодеки, поэтому склейка всегда без перекодирования.
+_PASSTHROUGH_OPTS = MappingProxyType(
+    {
+        "format": "bestvideo+bestaudio/best",
+        "merge_output_format": "mkv",
+        "postprocessor_args": MappingProxyType({"merger": ("-c", "copy")}),
+    }
+)
+
+# Конвертер срабатывает только если итоговый файл не mp4
+# (например, fallback на VP9/AV1) — тогда кодируем на GPU.
+_NVENC_OPTS = MappingProxyType(
+    {
+        "postprocessors": (
+            MappingProxyType({"key": "FFmpegVideoConvertor", "preferedformat": "mp4"}),
+        ),
+        "postprocessor_args": MappingProxyType(
+            {
+                # Без -hwaccel_output_format cuda: если GPU не декодирует кодек (например,
+                # AV1), ffmpeg сам переходит на программное декодирование.
+                "videoconvertor+ffmpeg_i": ("-hwaccel", "cuda"),
+                "videoconvertor": (
+                    "-c:v", "h264_nvenc", "-preset", "p4", "-rc", "vbr", "-cq", "23",
+                    "-c:a", "copy",
+                ),
+            }
+        ),
+    }
+)
 
-class DownloaderWorker(QObject):
+# yt-dlp сам запускает aria2c с -x16 -j16 -s16 --min-split-size 1M, своих аргументов не нужно.
+# Промежуточный прогресс aria2c в хук не передаёт — только итоговый «finished».
+_ARIA2_OPTS = MappingProxyType(
+    {
+        "external_downloader": MappingProxyType({"default": "aria2c"}),
+    }
+)
+
+# Минимальный интервал между обновлениями прогресса (50 мс).
+_PROGRESS_INTERVAL_NS = 50_000_000
+
+
+class WorkerSignals(QObject):
     progress_changed = Signal(int)
     log_message = Signal(str)
     finished = Signal(str)
     failed = Signal(str)
 
-    def __init__(self, url: str, output_dir: Path, mode: str, ffmpeg_location: Path | None):
+
+class DownloaderWorker(QRunnable):
+    """Загрузка в потоке из QThreadPool; сигналы живут в отдельном QObject (signals)."""
+
+    def __init__(
+        self,
+        urls: list[str],
+        output_dir: Path,
+        mode: str,
+        ffmpeg_location: Path | None,
+        nvenc_available: bool = False,
+        audio_codec: str = "m4a",
+        aria2_available: bool = False,
+    ):
         super().__init__()
-        self.url = url.strip()
+        # Временем жизни управляет MainWindow, а не пул потоков.
+        self.setAutoDelete(False)
+        self.signals = WorkerSignals()
+        # Хук прогресса вызывается тысячи раз — держим emit уже связанным.
+        self._emit_pct = self.signals.progress_changed.emit
+        self.urls = [url.strip() for url in urls if url.strip()]
         self.output_dir = output_dir
         self.mode = mode
         self.ffmpeg_location = ffmpeg_location
+        self.nvenc_available = nvenc_available
+        self.audio_codec = audio_codec
+        self.aria2_available = aria2_available
+        self._last_pct = -1
+        self._last_emit_ns = 0
+        self._url_index = 0
 
     def run(self) -> None:
-        if not self.url:
-            self.failed.emit("Вставьте ссылку на видео.")
+        if not self.urls:
+            self.signals.failed.emit("Вставьте ссылку на видео.")
             return
 
         self.output_dir.mkdir(parents=True, exist_ok=True)
 
+        if self.mode == "audio":
+            mode_opts = _AUDIO_MP3_OPTS if self.audio_codec == "mp3" else _AUDIO_M4A_OPTS
+        elif self.mode == "video_passthrough":
+            mode_opts = _PASSTHROUGH_OPTS
+        else:
+            mode_opts = _VIDEO_OPTS
+
         ydl_opts = {
+            **_BASE_OPTS,
+            **mode_opts,
             "outtmpl": str(self.output_dir / "%(title)s.%(ext)s"),
             "progress_hooks": [self._progress_hook],
-            "noprogress": True,
-            "quiet": True,
         }
 
         if self.ffmpeg_location:
             ydl_opts["ffmpeg_location"] = str(self.ffmpeg_location)
-            self.log_message.emit(f"ffmpeg: {self.ffmpeg_location}")
+            self.signals.log_message.emit(f"ffmpeg: {self.ffmpeg_location}")
 
-        if self.mode == "audio":
-            ydl_opts.update(
-                {
-                    "format": "bestaudio/best",
-                    "postprocessors": [
-                        {
-                            "key": "FFmpegExtractAudio",
-                            "preferredcodec": "mp3",
-                            "preferredquality": "192",
-                        }
-                    ],
-                }
-            )
-        else:
-            ydl_opts.update(
-                {
-                    "format": (
-                        "bestvideo[vcodec^=avc1][ext=mp4]+bestaudio[acodec^=mp4a][ext=m4a]/"
-                        "best[vcodec^=avc1][ext=mp4]/best[ext=mp4]/best"
-                    ),
-                    "merge_output_format": "mp4",
-                }
-            )
+        # yt-dlp принимает postprocessor_args только как dict — собираем свой на каждый запуск.
+        postprocessor_args = dict(mode_opts.get("postprocessor_args", {}))
+
+        if self.mode != "audio":
+            # В режиме без перекодирования NVENC не нужен: mkv принимает VP9/AV1 как есть.
+            if self.mode == "video" and self.nvenc_available:
+                ydl_opts["postprocessors"] = _NVENC_OPTS["postprocessors"]
+                postprocessor_args.update(_NVENC_OPTS["postprocessor_args"])
+                self.signals.log_message.emit("Перекодирование видео: NVENC (h264_nvenc)")
+            if self.aria2_available:
+                ydl_opts.update(_ARIA2_OPTS)
+                self.signals.log_message.emit("Загрузчик: aria2c (проценты загрузки недоступны)")
+
+        if postprocessor_args:
+            ydl_opts["postprocessor_args"] = postprocessor_args
 
         try:
-            self.log_message.emit("Начинаю загрузку...")
-            with YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(self.url, download=True)
-                title = info.get("title", "video")
+            # yt_dlp импортируется долго (реестр экстракторов), поэтому не на старте окна.
+            from yt_dlp import YoutubeDL
 
-            self.progress_changed.emit(100)
-            self.log_message.emit("Загрузка завершена.")
-            self.finished.emit(title)
+            self.signals.log_message.emit("Начинаю загрузку...")
+            titles: list[str] = []
+            errors: list[tuple[str, Exception]] = []
+            # Одна сессия YoutubeDL на все ссылки: player JS и соединения переиспользуются.
+            with YoutubeDL(ydl_opts) as ydl:
+                for index, url in enumerate(self.urls):
+                    self._url_index = index
+                    if len(self.urls) > 1:
+                        self.signals.log_message.emit(f"[{index + 1}/{len(self.urls)}] {url}")
+                    # Ошибка одной ссылки не прерывает остальные.
+                    try:
+                        info = ydl.extract_info(url, download=True)
+                    except Exception as exc:
+                        errors.append((url, exc))
+                        if len(self.urls) > 1:
+                            self.signals.log_message.emit(f"Ошибка загрузки {url}: {exc}")
+                        continue
+                    titles.append(info.get("title", "video"))
+
+            if len(self.urls) == 1 and errors:
+                self.signals.failed.emit(f"Ошибка загрузки: {errors[0][1]}")
+            elif errors:
+                if titles:
+                    self.signals.log_message.emit(f"Скачано: {', '.join(titles)}")
+                self.signals.failed.emit(
+                    f"Скачано {len(titles)} из {len(self.urls)}. Не удалось скачать:\n"
+                    + "\n".join(url for url, _ in errors)
+                )
+            else:
+                self.signals.progress_changed.emit(100)
+                self.signals.log_message.emit("Загрузка завершена.")
+                self.signals.finished.emit(", ".join(titles))
         except Exception as exc:
-            self.failed.emit(f"Ошибка загрузки: {exc}")
+            self.signals.failed.emit(f"Ошибка загрузки: {exc}")
 
     def _progress_hook(self, data: dict) -> None:
         status = data.get("status")
         if status == "downloading":
-            total = data.get("total_bytes") or data.get("total_bytes_estimate")
-            downloaded = data.get("downloaded_bytes", 0)
-            if total:
-                pct = int(downloaded / total * 100)
-                self.progress_changed.emit(max(0, min(100, pct)))
+            # Оценка размера бывает дробной (и меньше 1) — приводим к int до проверки.
+            total = int(data.get("total_bytes") or data.get("total_bytes_estimate") or 0)
+            if total <= 0:
+                return
+            # Целочисленные проценты: сначала по текущей ссылке, затем общий по всем ссылкам.
+            pct = min(100, int(data.get("downloaded_bytes") or 0) * 100 // total)
+            pct = (self._url_index * 100 + pct) // len(self.urls)
+            if pct == self._last_pct:
+                return
+            now_ns = time.monotonic_ns()
+            if now_ns - self._last_emit_ns > _PROGRESS_INTERVAL_NS:
+                self._last_pct = pct
+                self._last_emit_ns = now_ns
+                self._emit_pct(pct)
         elif status == "finished":
-            self.progress_changed.emit(95)
-            self.log_message.emit("Файл скачан, выполняю постобработку...")
+            self._emit_pct((self._url_index * 100 + 95) // len(self.urls))
+            self.signals.log_message.emit("Файл скачан, выполняю постобработку...")
 
 
 class MainWindow(QMainWindow):
@@ -143,20 +337,29 @@ class MainWindow(QMainWindow):
         self.setWindowTitle("YouTube Downloader (basic)")
         self.resize(700, 420)
 
-        self.thread: QThread | None = None
         self.worker: DownloaderWorker | None = None
         self.ffmpeg_location = find_ffmpeg_location()
+        # Выставляется асинхронной проверкой NVENC после проверки ffmpeg.
+        self.nvenc_available = False
+        self.aria2_available = shutil.which("aria2c") is not None
+        self._ffmpeg_bin: str | None = None
+        self._ffmpeg_ok: bool | None = None
 
-        self.url_input = QLineEdit()
-        self.url_input.setPlaceholderText("Вставьте ссылку на YouTube видео")
+        self.url_input = QPlainTextEdit()
+        self.url_input.setPlaceholderText("Вставьте ссылки на YouTube видео (по одной на строку)")
+        self.url_input.setMaximumHeight(90)
 
-        self.path_input = QLineEdit(str(Path.cwd() / "downloads"))
+        self.path_input = QLineEdit(str(_CWD / "downloads"))
         self.path_button = QPushButton("Выбрать папку")
         self.path_button.clicked.connect(self.choose_folder)
 
         self.mode_box = QComboBox()
-        self.mode_box.addItem("Видео (mp4)", "video")
-        self.mode_box.addItem("Аудио (mp3)", "audio")
+        self.mode_box.addItem("Видео (mp4)", ("video", None))
+        self.mode_box.addItem(
+            "Видео (VP9/AV1 в mkv, без перекодирования)", ("video_passthrough", None)
+        )
+        self.mode_box.addItem("Аудио (m4a, без перекодирования)", ("audio", "m4a"))
+        self.mode_box.addItem("Аудио (mp3, перекодирование)", ("audio", "mp3"))
 
         self.download_button = QPushButton("Скачать")
         self.download_button.clicked.connect(self.start_download)
@@ -166,6 +369,9 @@ class MainWindow(QMainWindow):
 
         self.log_box = QPlainTextEdit()
         self.log_box.setReadOnly(True)
+        # Лог как кольцевой буфер: старые строки вытесняются, перерисовка не растёт.
+        self.log_box.setMaximumBlockCount(500)
+        self.log_box.setCenterOnScroll(True)
 
         self._build_layout()
         self._check_dependencies()
@@ -175,7 +381,7 @@ class MainWindow(QMainWindow):
         self.setCentralWidget(root)
         layout = QVBoxLayout(root)
 
-        layout.addWidget(QLabel("Ссылка:"))
+        layout.addWidget(QLabel("Ссылки:"))
         layout.addWidget(self.url_input)
 
         path_row = QHBoxLayout()
@@ -194,7 +400,40 @@ class MainWindow(QMainWindow):
         layout.addWidget(self.log_box)
 
     def _check_dependencies(self) -> None:
-        if self._is_ffmpeg_available():
+        self._ffmpeg_bin = _ffmpeg_executable(self.ffmpeg_location)
+        if not self._ffmpeg_bin:
+            self._set_ffmpeg_ok(False)
+            return
+
+        # Запуск ffmpeg проверяем асинхронно, чтобы не задерживать первую отрисовку окна.
+        self._start_ffmpeg_probe(["-version"], self._set_ffmpeg_ok)
+
+    def _start_ffmpeg_probe(self, args: list[str], on_result: Callable[[bool], None]) -> None:
+        """Асинхронно запускает ffmpeg и передаёт в on_result, завершился ли он с кодом 0."""
+        process = QProcess(self)
+        process.setStandardOutputFile(QProcess.nullDevice())
+        process.setStandardErrorFile(QProcess.nullDevice())
+
+        def on_finished(exit_code: int, exit_status: QProcess.ExitStatus) -> None:
+            process.deleteLater()
+            on_result(exit_status == QProcess.ExitStatus.NormalExit and exit_code == 0)
+
+        def on_error(error: QProcess.ProcessError) -> None:
+            # При FailedToStart сигнал finished не приходит.
+            if error == QProcess.ProcessError.FailedToStart:
+                process.deleteLater()
+                on_result(False)
+
+        process.finished.connect(on_finished)
+        process.errorOccurred.connect(on_error)
+        process.start(self._ffmpeg_bin, args)
+
+    def _set_ffmpeg_ok(self, ok: bool) -> None:
+        if self._ffmpeg_ok is not None:
+            return
+        self._ffmpeg_ok = ok
+        if ok:
+            self._start_ffmpeg_probe(list(_NVENC_TEST_ARGS), self._set_nvenc_available)
             return
 
         QMessageBox.warning(
@@ -204,26 +443,8 @@ class MainWindow(QMainWindow):
             "Для portable-сборки положите ffmpeg.exe и ffprobe.exe рядом с .exe или в папку bin.",
         )
 
-    def _is_ffmpeg_available(self) -> bool:
-        try:
-            ffmpeg.probe
-            if self.ffmpeg_location:
-                subprocess.run(
-                    [str(self.ffmpeg_location / "ffmpeg.exe"), "-version"],
-                    check=True,
-                    stdout=subprocess.DEVNULL,
-                    stderr=subprocess.DEVNULL,
-                )
-            else:
-                subprocess.run(
-                    ["ffmpeg", "-version"],
-                    check=True,
-                    stdout=subprocess.DEVNULL,
-                    stderr=subprocess.DEVNULL,
-                )
-            return True
-        except Exception:
-            return False
+    def _set_nvenc_available(self, ok: bool) -> None:
+        self.nvenc_available = ok
 
     def choose_folder(self) -> None:
         folder = QFileDialog.getExistingDirectory(self, "Выберите папку")
@@ -231,55 +452,56 @@ class MainWindow(QMainWindow):
             self.path_input.setText(folder)
 
     def start_download(self) -> None:
-        if self.thread and self.thread.isRunning():
+        if self.worker is not None:
             QMessageBox.information(self, "Загрузка", "Дождитесь завершения текущей загрузки.")
             return
 
-        url = self.url_input.text().strip()
+        urls = self.url_input.toPlainText().split()
         output_dir = Path(self.path_input.text().strip())
-        mode = self.mode_box.currentData()
+        mode, audio_codec = self.mode_box.currentData()
 
+        # aria2c не сообщает промежуточный прогресс — вместо процентов индикатор занятости.
+        busy = self.aria2_available and mode != "audio"
+        self.progress_bar.setRange(0, 0 if busy else 100)
         self.progress_bar.setValue(0)
         self.log_box.clear()
         self.download_button.setEnabled(False)
 
-        self.thread = QThread()
-        self.worker = DownloaderWorker(url, output_dir, mode, self.ffmpeg_location)
-        self.worker.moveToThread(self.thread)
-
-        self.thread.started.connect(self.worker.run)
-        self.worker.progress_changed.connect(self.progress_bar.setValue)
-        self.worker.log_message.connect(self.append_log)
-        self.worker.finished.connect(self.on_finished)
-        self.worker.failed.connect(self.on_failed)
-
-        self.worker.finished.connect(self.thread.quit)
-        self.worker.failed.connect(self.thread.quit)
-        self.thread.finished.connect(self.cleanup_thread)
+        self.worker = DownloaderWorker(
+            urls,
+            output_dir,
+            mode,
+            self.ffmpeg_location,
+            self.nvenc_available,
+            audio_codec or "m4a",
+            self.aria2_available,
+        )
+        signals = self.worker.signals
+        signals.progress_changed.connect(self.progress_bar.setValue)
+        signals.log_message.connect(self.append_log)
+        signals.finished.connect(self.on_finished)
+        signals.failed.connect(self.on_failed)
 
-        self.thread.start()
+        QThreadPool.globalInstance().start(self.worker)
 
     def append_log(self, message: str) -> None:
         self.log_box.appendPlainText(message)
 
     def on_finished(self, title: str) -> None:
+        self.worker = None
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setValue(100)
         self.append_log(f"Готово: {title}")
         self.download_button.setEnabled(True)
         QMessageBox.information(self, "Успех", "Загрузка завершена.")
 
     def on_failed(self, error: str) -> None:
+        self.worker = None
+        self.progress_bar.setRange(0, 100)
         self.append_log(error)
         self.download_button.setEnabled(True)
         QMessageBox.critical(self, "Ошибка", error)
 
-    def cleanup_thread(self) -> None:
-        if self.worker:
-            self.worker.deleteLater()
-            self.worker = None
-        if self.thread:
-            self.thread.deleteLater()
-            self.thread = None
-
 
 def main() -> int:
     app = QApplication(sys.argv)